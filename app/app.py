@@ -1,5 +1,5 @@
 import streamlit as st
-from library_agent import run_agent
+from library_agent import run_agent, scheduler
 from chat_storage import (
     get_next_session_id,
     list_sessions,
@@ -53,6 +53,19 @@ else:
 current_session_id = st.session_state["session_id"]
 st.sidebar.markdown(f"**Current session:** `{current_session_id}`")
 
+# ====== Sidebar: LLM queue (shared by every open session) ======
+st.sidebar.header("LLM queue")
+m = scheduler.metrics()
+st.sidebar.markdown(
+    f"Running: **{m['running']}/{m['max_concurrency']}** · "
+    f"Queued: **{m['queue_depth']}** · Sessions waiting: **{m['sessions_waiting']}**"
+)
+st.sidebar.caption(
+    f"Wait p50 {m['wait_p50']:.1f}s · p99 {m['wait_p99']:.1f}s · max {m['wait_max']:.1f}s  \n"
+    f"Completed {m['completed']} · coalesced {m['coalesced']} · failed {m['failed']} · "
+    f"timeouts {m['timeouts']} · cancelled {m['cancelled']}"
+)
+
  
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
@@ -0,0 +1,87 @@
+"""
+Concurrency check for customer get-or-create in create_order.
+
+Many threads place a first order for the same new email at the same
+time (customer_id=0, as the agent sends it), typing the email in
+different cases. Every order must succeed, exactly one customer row must
+exist, and every order must point at it. Then the same for a customer
+stored earlier with a mixed-case email: no second row may appear.
+
+    python bench/bench_customer_upsert.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+import db  # noqa: E402
+import agent_tools  # noqa: E402
+
+THREADS = 32
+EMAIL = "New.Reader@Example.com"
+OLD_EMAIL = "Old.Reader@Example.com"  # stored as typed, before this change
+CASES = [str.lower, str.upper, lambda e: e]
+
+
+def _order(barrier, email, results, errors):
+    barrier.wait()
+    t0 = time.perf_counter()
+    try:
+        res = agent_tools.create_order(0, "New Reader", email,
+                                       [{"isbn": "978000000010", "qty": 1}])
+        results.append((res["customer_id"], res["order_id"], time.perf_counter() - t0))
+    except Exception as e:
+        errors.append(repr(e))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DB_PATH = os.path.join(workdir, "bench.db")
+        shutil.copy(os.path.join(ROOT, "db", "LibraryAg.db"), db.DB_PATH)
+        agent_tools.restock_book("978000000010", THREADS * 2)
+
+        conn = db.get_connection()
+        conn.execute("INSERT INTO customers (name, email) VALUES (?, ?)", ("Old Reader", OLD_EMAIL))
+        conn.commit()
+        conn.close()
+
+        ok = True
+        for label, email in (("first-time", EMAIL), ("existing mixed-case", OLD_EMAIL)):
+            barrier = threading.Barrier(THREADS)
+            results, errors = [], []
+            threads = [threading.Thread(target=_order,
+                                        args=(barrier, CASES[i % len(CASES)](email), results, errors))
+                       for i in range(THREADS)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            conn = db.get_connection()
+            rows = conn.execute("SELECT id FROM customers WHERE email = ? COLLATE NOCASE",
+                                (email,)).fetchall()
+            orphans = conn.execute(
+                "SELECT COUNT(*) FROM orders o LEFT JOIN customers c ON o.customer_id = c.id WHERE c.id IS NULL"
+            ).fetchone()[0]
+            conn.close()
+
+            customer_ids = {cid for cid, _, _ in results}
+            latencies = sorted(lat for _, _, lat in results)
+            print(f"{label}: orders ok={len(results)} failed={len(errors)} customers={len(rows)} "
+                  f"distinct ids={customer_ids} orphan orders={orphans}")
+            if latencies:
+                print(f"  create_order p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+                      f"max={latencies[-1] * 1000:.1f}ms")
+            print("  found:", agent_tools.find_customer(email=email.upper()))
+            ok = ok and (not errors and len(rows) == 1 and customer_ids == {rows[0][0]}
+                         and orphans == 0)
+            if errors:
+                print("  errors:", errors[:3])
+
+        print("PASS" if ok else "FAIL")
+        sys.exit(0 if ok else 1)
@@ -0,0 +1,69 @@
+"""
+Federated search latency as the number of branch shards grows.
+
+Every shard is a copy of db/LibraryAg.db padded with extra books.
+find_books / inventory_summary with no branch fan out to all shards in
+parallel; the sequential column queries the same shards one by one.
+
+    python bench/bench_federated_search.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+import db  # noqa: E402
+import agent_tools  # noqa: E402
+
+SHARD_COUNTS = [1, 2, 4, 8, 16]
+BOOKS_PER_SHARD = 50000
+REPEAT = 10
+
+
+def _make_shard(workdir, idx):
+    path = os.path.join(workdir, f"branch{idx}.db")
+    shutil.copy(os.path.join(ROOT, "db", "LibraryAg.db"), path)
+    db.register_branch(f"branch{idx}", path)
+    conn = db.get_connection(f"branch{idx}")
+    conn.executemany(
+        "INSERT INTO books (isbn, title, author, price, stock) VALUES (?, ?, ?, ?, ?)",
+        [(f"b{idx}-{i:07d}", f"Title {i} volume {idx}", f"Author {i % 700}", 12.5, i % 50)
+         for i in range(BOOKS_PER_SHARD)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - start) / REPEAT * 1000
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        for idx in range(max(SHARD_COUNTS)):
+            _make_shard(workdir, idx)
+        all_paths = dict(db.SHARDS)
+
+        print(f"cpus={os.cpu_count()} books/shard={BOOKS_PER_SHARD} timeout={agent_tools.SHARD_TIMEOUT}s")
+        print(f"{'shards':>6} {'rows':>6} {'find seq':>10} {'find par':>10} {'inv par':>10}")
+        for n in SHARD_COUNTS:
+            db.SHARDS.clear()
+            for name in list(all_paths)[:n]:
+                db.SHARDS[name] = all_paths[name]
+
+            found = agent_tools.find_books("Title 12", by="title")
+            rows = len(found["books"] if isinstance(found, dict) else found)
+            seq = _timed(lambda: [agent_tools._find_books_in(b, "Title 12", "title")
+                                  for b in db.list_branches()])
+            par = _timed(lambda: agent_tools.find_books("Title 12", by="title"))
+            inv = _timed(lambda: agent_tools.inventory_summary())
+            missing = agent_tools.inventory_summary().get("unavailable_branches", [])
+            print(f"{n:>6} {rows:>6} {seq:>8.1f}ms {par:>8.1f}ms {inv:>8.1f}ms"
+                  + (f"  unavailable={len(missing)}" if missing else ""))
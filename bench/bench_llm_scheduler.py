@@ -0,0 +1,95 @@
+"""
+Load test: 20 desk sessions hitting one stub "Ollama" at the same time,
+direct vs. through LLMScheduler.
+
+The stub model gets slower the more generations it runs at once
+(like a single local GPU), so unbounded fan-out hurts everyone.
+
+    python bench/bench_llm_scheduler.py
+"""
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "server"))
+
+from llm_scheduler import LLMScheduler, PRIORITY_DECIDE, PRIORITY_ANSWER  # noqa: E402
+
+SESSIONS = 20
+TURNS = 3
+DECIDE_COST = 0.02   # seconds of model time for a short JSON decision
+ANSWER_COST = 0.08   # seconds of model time for a final answer
+OVERSUBSCRIBE_PENALTY = 0.15  # extra slowdown per concurrent generation beyond one
+
+
+class StubModel:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.active = 0
+        self.calls = 0
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.active += 1
+            self.calls += 1
+            n = self.active
+        cost = DECIDE_COST if prompt.startswith("DECIDE") else ANSWER_COST
+        # time-sliced between n generations, plus thrashing overhead
+        time.sleep(cost * n * (1 + OVERSUBSCRIBE_PENALTY * (n - 1)))
+        with self._lock:
+            self.active -= 1
+        return SimpleNamespace(content="{}")
+
+
+def _session(call, sid, latencies):
+    for turn in range(TURNS):
+        # half the desks ask the same common question -> coalescible decision
+        question = "find AI books" if sid % 2 == 0 else f"question {sid}-{turn}"
+        t0 = time.perf_counter()
+        call(f"DECIDE {question}", PRIORITY_DECIDE, sid)
+        call(f"ANSWER {sid}-{turn}", PRIORITY_ANSWER, sid)
+        latencies.append(time.perf_counter() - t0)
+
+
+def run(call):
+    latencies = []
+    threads = [
+        threading.Thread(target=_session, args=(call, sid, latencies))
+        for sid in range(SESSIONS)
+    ]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(latencies), time.perf_counter() - t0
+
+
+def pct(values, p):
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def report(name, latencies, wall, model):
+    print(
+        f"{name:<10} turns={len(latencies):3d} model_calls={model.calls:3d} "
+        f"p50={pct(latencies, 50):6.2f}s p99={pct(latencies, 99):6.2f}s wall={wall:6.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    direct_model = StubModel()
+    lat, wall = run(lambda prompt, prio, sid: direct_model.invoke(prompt))
+    report("direct", lat, wall, direct_model)
+
+    sched_model = StubModel()
+    scheduler = LLMScheduler(sched_model, max_concurrency=2)
+    lat, wall = run(lambda prompt, prio, sid: scheduler.invoke(prompt, priority=prio, session_id=sid))
+    report("scheduled", lat, wall, sched_model)
+
+    m = scheduler.metrics()
+    print(
+        f"scheduler  coalesced={m['coalesced']} wait_p50={m['wait_p50']:.2f}s "
+        f"wait_p99={m['wait_p99']:.2f}s queue_depth={m['queue_depth']}"
+    )
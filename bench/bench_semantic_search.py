@@ -0,0 +1,120 @@
+"""
+Semantic search at scale, through the same path the app uses:
+a SQLite books table with N synthetic books (default 1,000,000) and
+semantic_search() on top of it.
+
+Reports the first search (which builds the index when none exists),
+steady-state query latency, the next search after inserting one book
+and after editing 1,000 titles, reopening the index, and memory.
+
+    python bench/bench_semantic_search.py [N]
+"""
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+import db  # noqa: E402
+import semantic_index as si  # noqa: E402
+
+TOPICS = ["neural networks", "deep learning", "databases", "statistics", "python",
+          "computer vision", "algorithms", "cooking", "gardening", "history",
+          "poetry", "economics", "astronomy", "chemistry", "music theory"]
+LEVELS = ["for beginners", "in practice", "advanced", "made easy", "handbook",
+          "101", "a field guide", "explained", "cookbook", "essentials"]
+QUERIES = ["something on neural networks for beginners", "intro to databases",
+           "practical statistics", "history of music", "python cookbook",
+           "astronomy explained", "gardening essentials", "advanced algorithms"]
+REPEAT = 20
+
+
+def _rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _fill(n):
+    rnd = random.Random(42)
+    conn = db.get_connection()
+    batch = []
+    for i in range(n):
+        title = f"{rnd.choice(TOPICS).title()} {rnd.choice(LEVELS)} vol {i % 97}"
+        batch.append((f"isbn-{i:08d}", title, f"Author{rnd.randrange(20000)}", 20.0, i % 9))
+        if len(batch) == 100_000:
+            conn.executemany("INSERT INTO books (isbn, title, author, price, stock) VALUES (?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO books (isbn, title, author, price, stock) VALUES (?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def _timed_search(q):
+    t0 = time.perf_counter()
+    hits = si.semantic_search(q)
+    return time.perf_counter() - t0, hits
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    with tempfile.TemporaryDirectory() as workdir:
+        db.DB_PATH = os.path.join(workdir, "bench.db")
+        shutil.copy(os.path.join(ROOT, "db", "LibraryAg.db"), db.DB_PATH)
+        t0 = time.perf_counter()
+        _fill(n)
+        print(f"books={n:,} dim={si.DIM} (SQLite fill {time.perf_counter() - t0:.1f}s)")
+
+        first, _ = _timed_search(QUERIES[0])
+        index = si.get_index()
+        size_mb = os.path.getsize(index.matrix_path) / 2**20
+        print(f"first search, builds index: {first:.1f}s ({n / first:,.0f} books/s), "
+              f"matrix={size_mb:.0f}MB float32 mmap")
+
+        steady = [_timed_search(QUERIES[i % len(QUERIES)])[0] for i in range(REPEAT)]
+        t0 = time.perf_counter()
+        for _ in range(REPEAT // 4 or 1):
+            index.search(QUERIES * 4, k=10)
+        batched = (time.perf_counter() - t0) / ((REPEAT // 4 or 1) * len(QUERIES) * 4)
+        print(f"search: p50={_pct(steady, 50):.1f}ms p99={_pct(steady, 99):.1f}ms  "
+              f"index.search batched(32)={batched * 1000:.1f}ms/query")
+
+        conn = db.get_connection()
+        conn.execute("INSERT INTO books (isbn, title, author, price, stock) VALUES (?, ?, ?, ?, ?)",
+                     ("bench-new", "Quantum Origami for Curious Minds", "Ann Lee", 10.0, 3))
+        conn.commit()
+        after_insert, hits = _timed_search("quantum origami")
+        found = bool(hits) and hits[0]["isbn"] == "bench-new"
+        print(f"next search after inserting 1 book: {after_insert * 1000:.1f}ms (found={found})")
+
+        edited = [f"isbn-{i:08d}" for i in range(0, n, max(1, n // 1000))][:1000]
+        conn.executemany("UPDATE books SET title = 'Bioluminescent Fungi Atlas' WHERE isbn = ?",
+                         [(isbn,) for isbn in edited])
+        conn.execute("UPDATE books SET stock = stock + 1 WHERE isbn IN "
+                     "(SELECT isbn FROM books LIMIT 1000)")
+        conn.commit()
+        conn.close()
+        after_edit, hits = _timed_search("bioluminescent fungi")
+        found = bool(hits) and all(h["isbn"] in set(edited) for h in hits)
+        print(f"next search after editing {len(edited):,} titles (+1,000 stock updates): "
+              f"{after_edit * 1000:.1f}ms (found={found})")
+
+        si._indexes.clear()
+        t0 = time.perf_counter()
+        si.get_index()
+        print(f"reopen index from disk: {(time.perf_counter() - t0) * 1000:.0f}ms")
+        print(f"rss now={_rss_mb():.0f}MB peak={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f}MB "
+              f"(mapped matrix pages count as file-backed rss)")
@@ -0,0 +1,114 @@
+"""
+SQLite read path and hot backup benchmark, run on a scratch copy of db/LibraryAg.db.
+
+1) read throughput (find_books / order_status / inventory_summary) while a
+   writer thread keeps calling create_order: the old setup (rollback
+   journal, read-write connection) vs WAL + get_read_connection()
+2) create_order latency with and without an online backup_database() running
+
+    python bench/bench_sqlite_read_path.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+import db  # noqa: E402
+import agent_tools  # noqa: E402
+
+READERS = 4
+DURATION = 3.0
+PAD_BOOKS = 20000  # make the file big enough for backup to take a while
+
+
+def _prepare(workdir, name, journal_mode):
+    path = os.path.join(workdir, name)
+    shutil.copy(os.path.join(ROOT, "db", "LibraryAg.db"), path)
+    db.DB_PATH = path
+    db._prepared.add(path)  # keep the journal mode chosen here
+    conn = db.get_connection()
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.executemany(
+        "INSERT OR IGNORE INTO books (isbn, title, author, price, stock) VALUES (?, ?, ?, ?, ?)",
+        [(f"bench-{i:07d}", f"Bench Title {i} " + "x" * 200, f"Author {i % 500}", 10.0, 1000000)
+         for i in range(PAD_BOOKS)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _writer(stop, latencies):
+    i = 0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        agent_tools.create_order(1, "Omar Ahmad", "omar@example.com",
+                                 [{"isbn": f"bench-{i % PAD_BOOKS:07d}", "qty": 1}])
+        latencies.append(time.perf_counter() - t0)
+        i += 1
+
+
+def _reader(stop, counter, lock):
+    n = 0
+    while not stop.is_set():
+        agent_tools.find_books("Bench Title 1234", by="title")
+        agent_tools.order_status(1)
+        agent_tools.order_status(2)
+        if n % 20 == 0:
+            agent_tools.inventory_summary()
+        n += 1
+    with lock:
+        counter[0] += n
+
+
+def read_throughput(label):
+    stop = threading.Event()
+    counter, lock, write_lat = [0], threading.Lock(), []
+    threads = [threading.Thread(target=_writer, args=(stop, write_lat))]
+    threads += [threading.Thread(target=_reader, args=(stop, counter, lock)) for _ in range(READERS)]
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    print(f"{label:<22} read rounds/s={counter[0] / DURATION:8.1f} orders/s={len(write_lat) / DURATION:8.1f}")
+
+
+def _pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] * 1000
+
+
+def order_latency(label, workdir, with_backup):
+    stop = threading.Event()
+    latencies = []
+    writer = threading.Thread(target=_writer, args=(stop, latencies))
+    writer.start()
+    if with_backup:
+        info = db.backup_database(os.path.join(workdir, "backup.db"))
+        label += f" ({info['pages']} pages in {info['seconds']:.2f}s)"
+    else:
+        time.sleep(1.0)
+    stop.set()
+    writer.join()
+    print(f"{label:<44} create_order p50={_pct(latencies, 50):6.2f}ms p99={_pct(latencies, 99):6.2f}ms")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare(workdir, "baseline.db", "DELETE")
+        original = agent_tools.get_read_connection
+        agent_tools.get_read_connection = db.get_connection
+        read_throughput("rollback journal, rw")
+        agent_tools.get_read_connection = original
+
+        _prepare(workdir, "bench.db", "WAL")
+        read_throughput("WAL, read-only")
+
+        order_latency("no backup", workdir, with_backup=False)
+        order_latency("during backup", workdir, with_backup=True)
@@ -8,9 +8,32 @@ CREATE TABLE IF NOT EXISTS books (
     title TEXT NOT NULL,
     author TEXT NOT NULL,
     price REAL NOT NULL,
-    stock INTEGER NOT NULL DEFAULT 0
+    stock INTEGER NOT NULL DEFAULT 0,
+    description TEXT  -- optional, used by semantic search
 );
 
+-- Books whose searchable text changed (read by the semantic index)
+CREATE TABLE IF NOT EXISTS books_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    isbn TEXT NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS books_changes_insert AFTER INSERT ON books
+BEGIN
+    INSERT INTO books_changes (isbn) VALUES (NEW.isbn);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_changes_update AFTER UPDATE OF isbn, title, author, description ON books
+BEGIN
+    INSERT INTO books_changes (isbn) SELECT OLD.isbn WHERE OLD.isbn IS NOT NEW.isbn;
+    INSERT INTO books_changes (isbn) VALUES (NEW.isbn);
+END;
+
+CREATE TRIGGER IF NOT EXISTS books_changes_delete AFTER DELETE ON books
+BEGIN
+    INSERT INTO books_changes (isbn) VALUES (OLD.isbn);
+END;
+
 -- Customers table
 CREATE TABLE IF NOT EXISTS customers (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -18,6 +41,9 @@ CREATE TABLE IF NOT EXISTS customers (
     email TEXT UNIQUE NOT NULL
 );
 
+-- Case-insensitive customer lookup by email
+CREATE INDEX IF NOT EXISTS idx_customers_email_nocase ON customers(email COLLATE NOCASE);
+
 -- Orders table
 CREATE TABLE IF NOT EXISTS orders (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -1,12 +1,48 @@
-from typing import List, Dict, Literal
-from db import get_connection
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, List, Dict, Literal, Tuple
+from db import get_connection, get_read_connection, list_branches, resolve_branch
+from semantic_index import semantic_search
 
-# 1) find_books({ q, by: "title" | "author" })
-def find_books(q: str, by: Literal["title", "author"] = "title") -> List[Dict]:
+# ========== Branch fan-out ==========
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "2.0"))
+
+
+def _fan_out(fn, *args, timeout: float | None = None) -> Tuple[Dict[str, Any], List[str]]:
     """
-    Search books by title or author.
-    Returns list of {isbn, title, author, price, stock}
+    Run fn(branch, *args) on every branch in parallel, one thread per branch.
+    Returns ({branch: result}, [branches that failed or timed out]).
+    A slow branch keeps only its own thread busy; later calls get fresh ones.
     """
+    timeout = SHARD_TIMEOUT if timeout is None else timeout
+    branches = list_branches()
+    pool = ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="shard")
+    try:
+        futures = {pool.submit(fn, branch, *args): branch for branch in branches}
+        done, _ = wait(futures, timeout=timeout)
+    finally:
+        # don't wait for stragglers; drop anything that never started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    results, unavailable = {}, []
+    for fut, branch in futures.items():
+        if fut not in done:
+            print(f"Branch {branch} timed out after {timeout}s")
+            unavailable.append(branch)
+        elif fut.exception() is not None:
+            print(f"Branch {branch} failed:", fut.exception())
+            unavailable.append(branch)
+        else:
+            results[branch] = fut.result()
+    return results, unavailable
+
+
+# 1) find_books({ q, by: "title" | "author" | "semantic", branch })
+def _find_books_in(branch: str | None, q: str, by: str,
+    wait_for_build: bool = True) -> List[Dict]:
+    if by == "semantic":
+        return semantic_search(q, branch=branch, wait_for_build=wait_for_build)
+
     column = "title" if by == "title" else "author"
     sql = f"""
         SELECT isbn, title, author, price, stock
@@ -16,7 +52,7 @@ def find_books(q: str, by: Literal["title", "author"] = "title") -> List[Dict]:
         """
     pattern = f"%{q}%"
 
-    conn = get_connection()
+    conn = get_read_connection(branch)
     try:
         cur = conn.execute(sql, (pattern,))
         rows = cur.fetchall()
@@ -25,23 +61,74 @@ def find_books(q: str, by: Literal["title", "author"] = "title") -> List[Dict]:
         conn.close()
 
 
-# 2) create_order({ customer_id, items: [{ isbn, qty }] })
+def find_books(q: str, by: Literal["title", "author", "semantic"] = "title",
+    branch: str | None = None) -> List[Dict] | Dict:
+    """
+    Search books by title or author.
+    Returns list of {isbn, title, author, price, stock}
+
+    by="semantic" matches the meaning of q against title/author/description
+    using the local vector index, and adds "score" (best first).
+
+    With no branch and several branches registered, searches all of them
+    in parallel and returns {books, unavailable_branches}; every row gets
+    "branch". Rows are ranked by prefix match first, then in-stock first,
+    then title.
+    """
+    if branch is not None or len(list_branches()) == 1:
+        return _find_books_in(resolve_branch(branch), q, by)
+
+    # catching up on changed books runs inside each shard's timeout; a shard
+    # whose semantic index is still building reports itself unavailable
+    # instead of holding up the others
+    per_branch, unavailable = _fan_out(_find_books_in, q, by, False)
+    column = "title" if by == "title" else "author"
+    needle = q.lower()
+
+    merged = [
+        {**row, "branch": b}
+        for b, rows in per_branch.items()
+        for row in rows
+    ]
+    if by == "semantic":
+        merged.sort(key=lambda r: -r["score"])
+    else:
+        merged.sort(key=lambda r: (
+            not r[column].lower().startswith(needle),
+            r["stock"] <= 0,
+            r["title"],
+            r["branch"],
+        ))
+    return {"books": merged, "unavailable_branches": unavailable}
+
+
+# 2) create_order({ customer_id, items: [{ isbn, qty }], branch })
 def create_order(customer_id: int, name: str,
-    email: str, items: List[Dict]) -> Dict:
+    email: str, items: List[Dict], branch: str | None = None) -> Dict:
     """
     Create a new order and reduce stock.
     items = [ {"isbn": "978...", "qty": 2}, ... ]
 
+    The customer is resolved first, in the same transaction:
+    existing customer_id, else get-or-create by email (case-insensitive).
+
     Returns:
         {
         "order_id": int,
+        "branch": str,
+        "customer_id": int,
         "total_items": int,
         "items": [...],
         }
     """
-    conn = get_connection()
+    branch = resolve_branch(branch)
+    conn = get_connection(branch)
     try:
         cur = conn.cursor()
+        # take the write lock up front so customer + stock checks can't race
+        cur.execute("BEGIN IMMEDIATE")
+
+        customer_id = _resolve_customer(cur, customer_id, name, email)
 
         cur.execute(
             "INSERT INTO orders (customer_id, created_at, status) VALUES (?, datetime('now'), 'pending')",
@@ -84,16 +171,12 @@ def create_order(customer_id: int, name: str,
                     "qty": qty,
                 }
             )
-        cur.execute("SELECT id FROM customers WHERE id = ?", (customer_id,))
-        row = cur.fetchone()
-
-        if row is None:
-            add_customer(customer_id, name, email)
-
         conn.commit()
 
         return {
             "order_id": order_id,
+            "branch": branch,
+            "customer_id": customer_id,
             "total_items": total_items,
             "items": result_items,
         }
@@ -105,13 +188,14 @@ def create_order(customer_id: int, name: str,
         conn.close()
 
 
-# 3) restock_book({ isbn, qty })
-def restock_book(isbn: str, qty: int) -> Dict:
+# 3) restock_book({ isbn, qty, branch })
+def restock_book(isbn: str, qty: int, branch: str | None = None) -> Dict:
     """
-    Increase stock for a book.
-    Returns {isbn, new_stock}
+    Increase stock for a book in one branch.
+    Returns {isbn, branch, new_stock}
     """
-    conn = get_connection()
+    branch = resolve_branch(branch)
+    conn = get_connection(branch)
     try:
         cur = conn.cursor()
         cur.execute("UPDATE books SET stock = stock + ? WHERE isbn = ?", (qty, isbn))
@@ -122,18 +206,19 @@ def restock_book(isbn: str, qty: int) -> Dict:
         stock = cur.fetchone()["stock"]
         conn.commit()
 
-        return {"isbn": isbn, "new_stock": stock}
+        return {"isbn": isbn, "branch": branch, "new_stock": stock}
     finally:
         conn.close()
 
 
-# 4) update_price({ isbn, price })
-def update_price(isbn: str, price: float) -> Dict:
+# 4) update_price({ isbn, price, branch })
+def update_price(isbn: str, price: float, branch: str | None = None) -> Dict:
     """
-    Update price for a book.
-    Returns {isbn, new_price}
+    Update price for a book in one branch.
+    Returns {isbn, branch, new_price}
     """
-    conn = get_connection()
+    branch = resolve_branch(branch)
+    conn = get_connection(branch)
     try:
         cur = conn.cursor()
         cur.execute("UPDATE books SET price = ? WHERE isbn = ?", (price, isbn))
@@ -141,17 +226,19 @@ def update_price(isbn: str, price: float) -> Dict:
             raise ValueError(f"Book with ISBN {isbn} not found")
 
         conn.commit()
-        return {"isbn": isbn, "new_price": price}
+        return {"isbn": isbn, "branch": branch, "new_price": price}
     finally:
         conn.close()
 
 
-# 5) order_status({ order_id })
-def order_status(order_id: int) -> Dict:
+# 5) order_status({ order_id, branch })
+def order_status(order_id: int, branch: str | None = None) -> Dict:
     """
     Return order summary with items.
+    Order ids are per branch, so look in the branch that took the order.
     """
-    conn = get_connection()
+    branch = resolve_branch(branch)
+    conn = get_read_connection(branch)
     try:
         cur = conn.cursor()
 
@@ -199,6 +286,7 @@ def order_status(order_id: int) -> Dict:
 
         return {
             "order_id": order_row["id"],
+            "branch": branch,
             "created_at": order_row["created_at"],
             "status": order_row["status"],
             "customer": {
@@ -213,12 +301,9 @@ def order_status(order_id: int) -> Dict:
         conn.close()
 
 
-# 6) inventory_summary()
-def inventory_summary(low_stock_threshold: int = 3) -> Dict:
-    """
-    Returns low-stock titles and counts per stock level.
-    """
-    conn = get_connection()
+# 6) inventory_summary({ branch })
+def _inventory_summary_in(branch: str | None, low_stock_threshold: int) -> Dict:
+    conn = get_read_connection(branch)
     try:
         cur = conn.cursor()
 
@@ -257,18 +342,108 @@ def inventory_summary(low_stock_threshold: int = 3) -> Dict:
         conn.close()
 
 
-#This because avoid the error if we add order for customer not in the customer table if we do order_status
-def add_customer(customer_id, name, email):
-    conn = get_connection()
+def inventory_summary(low_stock_threshold: int = 3, branch: str | None = None) -> Dict:
+    """
+    Returns low-stock titles and counts per stock level.
+
+    With no branch and several branches registered, every branch is
+    summarised in parallel: low-stock rows get a "branch" key, levels are
+    summed, and branches that did not answer in time are listed.
+    """
+    if branch is not None or len(list_branches()) == 1:
+        return _inventory_summary_in(resolve_branch(branch), low_stock_threshold)
+
+    per_branch, unavailable = _fan_out(_inventory_summary_in, low_stock_threshold)
+
+    low_stock = [
+        {**row, "branch": b}
+        for b, summary in per_branch.items()
+        for row in summary["low_stock_titles"]
+    ]
+    low_stock.sort(key=lambda r: (r["stock"], r["title"], r["branch"]))
+
+    levels: Dict[str, int] = {}
+    for summary in per_branch.values():
+        for level, count in summary["stock_levels"].items():
+            levels[level] = levels.get(level, 0) + count
+
+    return {
+        "low_stock_titles": low_stock,
+        "stock_levels": levels,
+        "branches": {b: summary["stock_levels"] for b, summary in per_branch.items()},
+        "unavailable_branches": unavailable,
+    }
+
+
+# ========== Customers ==========
+# customers.email is UNIQUE but case-sensitive, and older rows keep the case
+# they were typed with, so lookups use the NOCASE index on email
+# (idx_customers_email_nocase, created by db.get_connection).
+
+
+def _clean_email(email: str | None) -> str:
+    return (email or "").strip()
+
+
+def _resolve_customer(cur, customer_id: int, name: str, email: str) -> int:
+    """
+    Return the id to use for an order, inside the caller's write transaction
+    (BEGIN IMMEDIATE, so the lookup and insert can't race other orders).
+    1) customer_id > 0 and exists -> that id (PK lookup)
+    2) email given -> existing customer with that email, any case (NOCASE index)
+    3) else create it; ON CONFLICT(email) keeps the UNIQUE constraint quiet
+    """
+    if customer_id and customer_id > 0:
+        cur.execute("SELECT id FROM customers WHERE id = ?", (customer_id,))
+        row = cur.fetchone()
+        if row is not None:
+            return row["id"]
+
+    email = _clean_email(email)
+    if not email:
+        raise ValueError(
+            f"Customer {customer_id} not found. Provide the customer's email to create them."
+        )
+
+    cur.execute(
+        "SELECT id FROM customers WHERE email = ? COLLATE NOCASE ORDER BY id LIMIT 1",
+        (email,),
+    )
+    row = cur.fetchone()
+    if row is not None:
+        return row["id"]
+
+    cur.execute(
+        "INSERT INTO customers (name, email) VALUES (?, ?) ON CONFLICT(email) DO NOTHING",
+        (name or email, email),
+    )
+    cur.execute("SELECT id FROM customers WHERE email = ?", (email,))
+    return cur.fetchone()["id"]
+
+
+# 7) find_customer({ customer_id, email, branch })
+def find_customer(customer_id: int = 0, email: str = "", branch: str | None = None) -> Dict:
+    """
+    Look up a customer by id or email (email match ignores case).
+    Returns {id, name, email}
+    """
+    conn = get_read_connection(branch)
     try:
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO customers (name, email) VALUES (?, ?)",
-            (name, email)
-        )
-        customer_id = cur.lastrowid  
-        conn.commit()
-        return customer_id           
+        row = None
+        if customer_id and customer_id > 0:
+            cur.execute("SELECT id, name, email FROM customers WHERE id = ?", (customer_id,))
+            row = cur.fetchone()
+        if row is None and _clean_email(email):
+            cur.execute(
+                "SELECT id, name, email FROM customers "
+                "WHERE email = ? COLLATE NOCASE ORDER BY id LIMIT 1",
+                (_clean_email(email),),
+            )
+            row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"Customer not found (id={customer_id}, email={email!r})")
+        return dict(row)
     finally:
         conn.close()
 
@@ -2,7 +2,7 @@ from typing import List, Dict, Any
 from datetime import datetime
 import json
 
-from db import get_connection
+from db import get_connection, get_read_connection
 
 
 def _now_iso() -> str:
@@ -29,7 +29,7 @@ def list_sessions() -> List[Dict[str, Any]]:
     """
     return list of sessions from messages table
     """
-    conn = get_connection()
+    conn = get_read_connection()
     try:
         cur = conn.cursor()
         cur.execute(
@@ -54,7 +54,7 @@ def load_messages(session_id: int) -> List[Dict[str, str]]:
     """
     [{ "role": "user" | "assistant", "content": "..." }, ...]
     """
-    conn = get_connection()
+    conn = get_read_connection()
     try:
         cur = conn.cursor()
         cur.execute(
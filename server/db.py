@@ -1,8 +1,178 @@
+import os
 import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
 
 DB_PATH = "LibraryAg.db"
 
-def get_connection():
-    conn = sqlite3.connect(DB_PATH)
+# ========== Branch shards ==========
+# Each library branch owns its own inventory DB.
+# LIBRARY_BRANCHES="main=LibraryAg.db,north=north.db"
+# With no shards registered, DEFAULT_BRANCH is DB_PATH.
+# With shards registered, branch=None means DEFAULT_BRANCH if registered,
+# else the first branch listed (which also holds the chat history).
+DEFAULT_BRANCH = "main"
+SHARDS: Dict[str, str] = {}
+
+_prepared = set()
+
+
+def register_branch(branch: str, path: str) -> None:
+    SHARDS[branch] = path
+
+
+def list_branches() -> List[str]:
+    return list(SHARDS) or [DEFAULT_BRANCH]
+
+
+def resolve_branch(branch: Optional[str] = None) -> str:
+    """
+    Name of the registered branch that `branch` refers to (None = default).
+    """
+    if branch is None:
+        if not SHARDS or DEFAULT_BRANCH in SHARDS:
+            return DEFAULT_BRANCH
+        return next(iter(SHARDS))
+    if branch in SHARDS or (not SHARDS and branch == DEFAULT_BRANCH):
+        return branch
+    raise ValueError(f"Unknown branch '{branch}'. Known branches: {', '.join(list_branches())}")
+
+
+def shard_path(branch: Optional[str] = None) -> str:
+    """
+    DB path that owns `branch`. None means the default branch.
+    """
+    branch = resolve_branch(branch)
+    return SHARDS.get(branch, DB_PATH)
+
+
+def _load_branches_from_env() -> None:
+    for entry in os.getenv("LIBRARY_BRANCHES", "").split(","):
+        if "=" in entry:
+            branch, path = entry.split("=", 1)
+            register_branch(branch.strip(), path.strip())
+
+
+_load_branches_from_env()
+
+
+def _prepare_db(conn, path):
+    # Once per DB per process, committed on its own (never inside a tool's
+    # transaction, whose rollback would undo it):
+    # - journal_mode=WAL, which is stored in the file
+    # - indexes added after the schema shipped, for existing DB files
+    if path in _prepared:
+        return
+    conn.execute("PRAGMA journal_mode=WAL")
+    has_customers = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customers'"
+    ).fetchone()
+    if has_customers:
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_customers_email_nocase "
+            "ON customers(email COLLATE NOCASE)"
+        )
+        conn.commit()
+    _ensure_books_changes(conn)
+    _prepared.add(path)
+
+
+def _ensure_books_changes(conn):
+    # books_changes logs every isbn whose searchable text was inserted,
+    # edited or deleted, by any writer, so the semantic index can catch up
+    # on just those rows (see semantic_index.refresh_index)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(books)")]
+    if not columns:
+        return
+    text_columns = ", ".join(c for c in ("isbn", "title", "author", "description") if c in columns)
+    conn.executescript(f"""
+        CREATE TABLE IF NOT EXISTS books_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            isbn TEXT NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS books_changes_insert AFTER INSERT ON books
+        BEGIN
+            INSERT INTO books_changes (isbn) VALUES (NEW.isbn);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_changes_update AFTER UPDATE OF {text_columns} ON books
+        BEGIN
+            INSERT INTO books_changes (isbn) SELECT OLD.isbn WHERE OLD.isbn IS NOT NEW.isbn;
+            INSERT INTO books_changes (isbn) VALUES (NEW.isbn);
+        END;
+        CREATE TRIGGER IF NOT EXISTS books_changes_delete AFTER DELETE ON books
+        BEGIN
+            INSERT INTO books_changes (isbn) VALUES (OLD.isbn);
+        END;
+    """)
+
+
+def get_connection(branch: Optional[str] = None):
+    path = shard_path(branch)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row  #dict-like
+    _prepare_db(conn, path)
+    return conn
+
+
+def get_read_connection(branch: Optional[str] = None, check_same_thread: bool = True):
+    """
+    Read-only connection (mode=ro + query_only).
+    Under WAL it reads a snapshot and never blocks or waits on writers.
+    """
+    path = shard_path(branch)
+    if path not in _prepared:
+        get_connection(branch).close()
+    uri = Path(path).resolve().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row  #dict-like
-    return conn
\ No newline at end of file
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def backup_database(dest_path: str, pages: int = 64, sleep: float = 0.005,
+                    branch: Optional[str] = None) -> dict:
+    """
+    Online hot backup using the sqlite3 backup API.
+    Copies `pages` pages per step and sleeps between steps so writers keep going.
+    The source read transaction is held open, so the copy is one consistent
+    WAL snapshot and is not restarted by concurrent writes.
+    Returns {dest, pages, seconds}
+    """
+    src = get_read_connection(branch)
+    dst = sqlite3.connect(dest_path)
+    start = time.perf_counter()
+    total = 0
+
+    def _progress(status, remaining, page_count):
+        nonlocal total
+        total = page_count
+        # sqlite3 only sleeps on BUSY, so yield to writers between steps here
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    try:
+        src.execute("BEGIN")
+        src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        src.backup(dst, pages=pages, progress=_progress)
+        src.execute("COMMIT")
+        return {
+            "dest": dest_path,
+            "pages": total,
+            "seconds": time.perf_counter() - start,
+        }
+    finally:
+        dst.close()
+        src.close()
+
+
+# ========== CLI ==========
+# python db.py backup <dest_path> [branch]
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4) or sys.argv[1] != "backup":
+        print("usage: python db.py backup <dest_path> [branch]")
+        sys.exit(1)
+    branch = sys.argv[3] if len(sys.argv) == 4 else None
+    info = backup_database(sys.argv[2], branch=branch)
+    print(f"Backed up {shard_path(branch)} -> {info['dest']} ({info['pages']} pages, {info['seconds']:.2f}s)")
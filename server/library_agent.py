@@ -1,4 +1,5 @@
 import json
+import os
 from typing import Dict, Any
 
 from langchain_ollama import ChatOllama
@@ -10,9 +11,11 @@ from agent_tools import (
     update_price,
     order_status,
     inventory_summary,
-    add_customer,
+    find_customer,
 )
 from chat_storage import log_tool_call
+from llm_scheduler import LLMScheduler, PRIORITY_DECIDE, PRIORITY_ANSWER
+from semantic_index import warm_indexes
 
 # ==========Prepare the LLM ==========
 llm = ChatOllama(
@@ -20,6 +23,16 @@ llm = ChatOllama(
     temperature=0,
 )
 
+# All sessions share one local model, so every call goes through the scheduler
+scheduler = LLMScheduler(
+    llm,
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "2")),
+)
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+
+# Build missing semantic indexes in the background, not in the first search
+warm_indexes()
+
 # ========== SYSTEM PROMPT ==========
 TOOLS_DESCRIPTION = """
 You are a Library Desk Agent that can call backend functions (tools) that interact with a SQLite database.
@@ -28,31 +41,34 @@ You MUST decide which single action to perform for each user request.
 Return ONLY a valid JSON object with no extra text, in this exact format:
 
 {
-    "action": "<one of: find_books | create_order | restock_book | update_price | order_status | inventory_summary | none>",
+    "action": "<one of: find_books | create_order | restock_book | update_price | order_status | inventory_summary | find_customer | none>",
     "args": { ... }
 }
 
 Tools you can use:
 
 1) find_books
-    - Use when the user wants to search for books by title or author.
+    - Use when the user wants to search for books by title or author,
+      or describes a topic ("something on neural networks for beginners") -> use "semantic".
     - Args:
         {
         "q": "<search text>",
-        "by": "title" or "author"
+        "by": "title" or "author" or "semantic",
+        "branch": "<branch name>"     // optional, omit to search all branches
         }
 
 2) create_order
     - Use when the user wants to create a new order for a customer.
     - Args:
         {
-         "customer_id": <integer>,      // If unknown, use 0
+         "customer_id": <integer>,      // If unknown, use 0 and give name + email
         "name": "<customer name>",
         "email": "<customer email>",
         "items": [
             { "isbn": "<book isbn>", "qty": <integer> },
             ...
-        ]
+        ],
+        "branch": "<branch name>"     // optional, branch that sells the books
         }
 
 3) restock_book
@@ -60,7 +76,8 @@ Tools you can use:
     - Args:
         {
         "isbn": "<book isbn>",
-        "qty": <integer>
+        "qty": <integer>,
+        "branch": "<branch name>"     // optional
         }
 
 4) update_price
@@ -68,22 +85,30 @@ Tools you can use:
     - Args:
         {
         "isbn": "<book isbn>",
-        "price": <float>
+        "price": <float>,
+        "branch": "<branch name>"     // optional
         }
 
 5) order_status
     - Use when the user asks about details of an order.
     - Args:
         {
-        "order_id": <integer>
+        "order_id": <integer>,
+        "branch": "<branch name>"     // optional, branch that took the order
         }
 
 6) inventory_summary
     - Use when the user wants to know which books have low stock or get an inventory summary.
-    - Args: { }
+    - Args: { "branch": "<branch name>" }   // optional, omit for all branches
 
-7) add_customer 
-    - add new customers to the customer table
+7) find_customer
+    - Use when the user asks about a customer, or to get a customer's id before an order.
+    - Args:
+        {
+        "customer_id": <integer>,      // If unknown, use 0
+        "email": "<customer email>",
+        "branch": "<branch name>"     // optional
+        }
     
 8) none
     - Use when the question does NOT need any database tool (for example, a casual greeting like "hello").
@@ -95,14 +120,16 @@ Important:
 """
 
 # ========== Decide Which action ==========
-def decide_action(user_message: str) -> Dict[str, Any]:
+def decide_action(user_message: str, session_id: int | None = None) -> Dict[str, Any]:
     """
     Ask the LLM which action+args to use.
     LLM must return pure JSON. We parse it here.
     """
     prompt = TOOLS_DESCRIPTION + f'\n\nUser message:\n"{user_message}"\n\nJSON:'
 
-    response = llm.invoke(prompt)
+    response = scheduler.invoke(
+        prompt, priority=PRIORITY_DECIDE, session_id=session_id, timeout=LLM_TIMEOUT
+    )
     content = response.content
 
     # Clean the content
@@ -124,34 +151,42 @@ def decide_action(user_message: str) -> Dict[str, Any]:
 
 # ========== Backend excution ==========
 def execute_action(action: str, args: Dict[str, Any], session_id: int | None = None) -> Any:
+    branch = args.get("branch") or None
+
     if action == "find_books":
         q = args.get("q", "")
         by = args.get("by", "title")
-        result = find_books(q=q, by=by)
+        result = find_books(q=q, by=by, branch=branch)
 
     elif action == "create_order":
         customer_id = int(args.get("customer_id", 0))
         name = args.get("name", "")
         email = args.get("email", "")
         items = args.get("items", [])
-        result = create_order(customer_id=customer_id, name=name, email=email, items=items)
+        result = create_order(customer_id=customer_id, name=name, email=email, items=items,
+                              branch=branch)
 
     elif action == "restock_book":
         isbn = args.get("isbn", "")
         qty = int(args.get("qty", 0))
-        result = restock_book(isbn=isbn, qty=qty)
+        result = restock_book(isbn=isbn, qty=qty, branch=branch)
 
     elif action == "update_price":
         isbn = args.get("isbn", "")
         price = float(args.get("price", 0.0))
-        result = update_price(isbn=isbn, price=price)
+        result = update_price(isbn=isbn, price=price, branch=branch)
 
     elif action == "order_status":
         order_id = int(args.get("order_id", 0))
-        result = order_status(order_id=order_id)
+        result = order_status(order_id=order_id, branch=branch)
 
     elif action == "inventory_summary":
-        result = inventory_summary()
+        result = inventory_summary(branch=branch)
+
+    elif action == "find_customer":
+        customer_id = int(args.get("customer_id", 0))
+        email = args.get("email", "")
+        result = find_customer(customer_id=customer_id, email=email, branch=branch)
 
     else:
         result = None
@@ -164,12 +199,14 @@ def execute_action(action: str, args: Dict[str, Any], session_id: int | None = N
 
 
 # ========== Final answer ==========
-def build_final_answer(user_message: str, action: str, args: Dict[str, Any], result: Any) -> str:
+def build_final_answer(user_message: str, action: str, args: Dict[str, Any], result: Any,
+                       session_id: int | None = None) -> str:
     
     # No tool:
     if action == "none" or result is None:
-        response = llm.invoke(
-            f"You are a friendly Library Desk Agent. Answer this user message directly:\n\n{user_message}"
+        response = scheduler.invoke(
+            f"You are a friendly Library Desk Agent. Answer this user message directly:\n\n{user_message}",
+            priority=PRIORITY_ANSWER, session_id=session_id, timeout=LLM_TIMEOUT,
         )
         return response.content
 
@@ -193,14 +230,16 @@ Now, write a clear and friendly answer to the user explaining this result.
 If the user speaks Arabic, you can answer in Arabic (with technical terms in English if needed).
 """
 
-    response = llm.invoke(final_prompt)
+    response = scheduler.invoke(
+        final_prompt, priority=PRIORITY_ANSWER, session_id=session_id, timeout=LLM_TIMEOUT
+    )
     return response.content
 
 
 # ========== Run Agent ==========
 def run_agent(user_message: str, session_id: int | None = None) -> str:
 
-    decision = decide_action(user_message)
+    decision = decide_action(user_message, session_id=session_id)
     action = decision.get("action", "none")
     args = decision.get("args", {})
 
@@ -208,7 +247,7 @@ def run_agent(user_message: str, session_id: int | None = None) -> str:
 
     result = execute_action(action, args, session_id=session_id)
 
-    answer = build_final_answer(user_message, action, args, result)
+    answer = build_final_answer(user_message, action, args, result, session_id=session_id)
     return answer
 
 
@@ -0,0 +1,288 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, CancelledError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Hashable, Optional
+
+# ========== Priorities ==========
+# Lower value = served first.
+PRIORITY_DECIDE = 0   # short decide_action calls
+PRIORITY_ANSWER = 1   # long final-answer generations
+
+
+class _Job:
+    """One queued LLM call, possibly shared by several coalesced callers."""
+
+    def __init__(self, key: Hashable, prompt: Any, session_id: Any):
+        self.key = key
+        self.prompt = prompt
+        self.session_id = session_id
+        self.future: Future = Future()
+        self.waiters = 1
+        self.enqueued_at = time.monotonic()
+        self.started = False
+
+
+class LLMRequest:
+    """
+    Handle for one caller's scheduled call (see LLMScheduler.submit).
+    cancel() detaches this caller; the model call itself is dropped only if
+    it has not started and no coalesced caller still waits for it.
+    """
+
+    def __init__(self, scheduler: "LLMScheduler", job: _Job, session_id: Any):
+        self._scheduler = scheduler
+        self._job = job
+        self.session_id = session_id
+        self._done = False
+        self._cancelled = False
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """
+        Wait for the response.
+        Raises TimeoutError after `timeout` seconds (and cancels this request),
+        CancelledError if the request was cancelled.
+        """
+        if self._cancelled:
+            raise CancelledError()
+        try:
+            return self._job.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._scheduler._count("timeouts")
+            self.cancel()
+            raise TimeoutError(f"LLM call timed out after {timeout}s")
+        finally:
+            self._detach()
+
+    def cancel(self) -> bool:
+        """
+        Give up on this request. Returns True if the model call was dropped.
+        """
+        if self._done:
+            return False
+        self._cancelled = True
+        self._detach()
+        return self._scheduler._abandon(self._job)
+
+    def _detach(self) -> None:
+        if not self._done:
+            self._done = True
+            self._scheduler._forget(self)
+
+
+class LLMScheduler:
+    """
+    Sits in front of a LangChain chat model and limits how many
+    generations run at the same time.
+
+    - at most `max_concurrency` calls reach the model at once
+    - queued calls are ordered by (priority, per-session turn, arrival);
+      turns are a per-session virtual time that persists across calls,
+      so a desk that keeps asking goes behind desks that asked less
+    - identical prompts already queued or running are coalesced
+      (single-flight): the model is called once and every caller gets
+      the same response
+    - callers can pass a timeout or cancel a submitted request
+      (one by one or a whole session); if the last waiter of a queued
+      job gives up, the job is dropped before it reaches the model
+    """
+
+    def __init__(self, client: Any, max_concurrency: int = 2, wait_samples: int = 1000):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be >= 1")
+        self.client = client
+        self.max_concurrency = max_concurrency
+
+        self._cond = threading.Condition()
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._inflight: Dict[Hashable, _Job] = {}   # key -> queued or running job
+        self._session_pending: Dict[Any, int] = {}
+        self._session_turn: Dict[Any, int] = {}     # last turn given to each session
+        self._session_requests: Dict[Any, set] = {}  # open LLMRequest handles
+        self._vclock = 0                             # turn of the last started job
+        self._running = 0
+
+        self._wait_times: deque = deque(maxlen=wait_samples)
+        self._counters = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "cancelled": 0,
+        }
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"llm-worker-{i}", daemon=True)
+            for i in range(max_concurrency)
+        ]
+        for w in self._workers:
+            w.start()
+
+    # ========== Public API ==========
+    def invoke(
+        self,
+        prompt: Any,
+        priority: int = PRIORITY_ANSWER,
+        session_id: Any = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Same contract as `client.invoke(prompt)`, but scheduled.
+        Raises TimeoutError if no result arrives within `timeout` seconds,
+        CancelledError if the request was cancelled (e.g. by cancel_session).
+        """
+        return self.submit(prompt, priority=priority, session_id=session_id).result(timeout)
+
+    def submit(self, prompt: Any, priority: int = PRIORITY_ANSWER,
+               session_id: Any = None) -> LLMRequest:
+        """
+        Queue a call without waiting. Use .result() / .cancel() on the handle.
+        """
+        job = self._enqueue(prompt, priority, session_id)
+        request = LLMRequest(self, job, session_id)
+        with self._cond:
+            self._session_requests.setdefault(session_id, set()).add(request)
+        return request
+
+    def cancel_session(self, session_id: Any) -> int:
+        """
+        Cancel every open request of a session (e.g. the user left the page).
+        Returns how many model calls were dropped.
+        """
+        with self._cond:
+            requests = list(self._session_requests.get(session_id, ()))
+        return sum(1 for r in requests if r.cancel())
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Snapshot of queue depth, running calls, counters and wait times (seconds).
+        """
+        with self._cond:
+            waits = sorted(self._wait_times)
+            data = dict(self._counters)
+            data["queue_depth"] = sum(1 for _, _, _, job in self._heap if not job.future.cancelled())
+            data["running"] = self._running
+            data["max_concurrency"] = self.max_concurrency
+            data["sessions_waiting"] = sum(1 for n in self._session_pending.values() if n > 0)
+
+        data["wait_p50"] = _percentile(waits, 50)
+        data["wait_p99"] = _percentile(waits, 99)
+        data["wait_max"] = waits[-1] if waits else 0.0
+        return data
+
+    # ========== Internals ==========
+    def _enqueue(self, prompt: Any, priority: int, session_id: Any) -> _Job:
+        key = _prompt_key(prompt)
+        with self._cond:
+            self._counters["submitted"] += 1
+
+            job = self._inflight.get(key)
+            if job is not None and not job.future.cancelled():
+                job.waiters += 1
+                self._counters["coalesced"] += 1
+                return job
+
+            job = _Job(key, prompt, session_id)
+            self._inflight[key] = job
+
+            # Per-session virtual time: each call takes the session's next
+            # turn, but never one older than the jobs being served now, so an
+            # idle session gets no saved-up credit.
+            turn = max(self._session_turn.get(session_id, 0) + 1, self._vclock)
+            self._session_turn[session_id] = turn
+            self._session_pending[session_id] = self._session_pending.get(session_id, 0) + 1
+
+            heapq.heappush(self._heap, (priority, turn, next(self._seq), job))
+            self._cond.notify()
+            return job
+
+    def _abandon(self, job: _Job) -> bool:
+        with self._cond:
+            job.waiters -= 1
+            if job.waiters <= 0 and not job.started and job.future.cancel():
+                self._counters["cancelled"] += 1
+                self._release(job)
+                return True
+            return False
+
+    def _forget(self, request: LLMRequest) -> None:
+        with self._cond:
+            open_requests = self._session_requests.get(request.session_id)
+            if open_requests is not None:
+                open_requests.discard(request)
+                if not open_requests:
+                    del self._session_requests[request.session_id]
+
+    def _count(self, counter: str) -> None:
+        with self._cond:
+            self._counters[counter] += 1
+
+    def _release(self, job: _Job) -> None:
+        # caller holds self._cond
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        pending = self._session_pending.get(job.session_id, 0) - 1
+        if pending > 0:
+            self._session_pending[job.session_id] = pending
+        else:
+            self._session_pending.pop(job.session_id, None)
+
+    def _next_job(self) -> _Job:
+        with self._cond:
+            while True:
+                while not self._heap:
+                    self._cond.wait()
+                _, turn, _, job = heapq.heappop(self._heap)
+                if job.future.cancelled():
+                    continue
+                if turn > self._vclock:
+                    self._vclock = turn
+                    self._prune_turns()
+                job.started = True
+                job.future.set_running_or_notify_cancel()
+                self._running += 1
+                self._wait_times.append(time.monotonic() - job.enqueued_at)
+                return job
+
+    def _prune_turns(self) -> None:
+        # caller holds self._cond; sessions at or behind the clock behave
+        # exactly like new ones, so their entry can go
+        if len(self._session_turn) > 1000:
+            self._session_turn = {
+                sid: t for sid, t in self._session_turn.items() if t > self._vclock
+            }
+
+    def _worker(self) -> None:
+        while True:
+            job = self._next_job()
+            try:
+                result = self.client.invoke(job.prompt)
+            except BaseException as e:
+                outcome = "failed"
+                job.future.set_exception(e)
+            else:
+                outcome = "completed"
+                job.future.set_result(result)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    self._counters[outcome] += 1
+                    self._release(job)
+
+
+def _prompt_key(prompt: Any) -> Hashable:
+    if isinstance(prompt, str):
+        return prompt
+    return repr(prompt)
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
@@ -0,0 +1,483 @@
+import json
+import os
+import re
+import sys
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db import get_read_connection, list_branches, shard_path
+
+# ========== Embedding ==========
+# Offline hashing vectoriser: words + character 3-grams hashed into DIM
+# signed buckets, L2-normalised. Char n-grams let "beginner" match
+# "Beginners" and "network" match "Networks" without any model download.
+DIM = 256
+WORD_WEIGHT = 1.0
+NGRAM_WEIGHT = 0.5
+EMBED_BATCH = 20000
+SEARCH_CHUNK = 131072  # rows per matmul, bounds temporary memory
+MIN_SCORE = 0.1        # below this it is hash-collision noise
+INDEX_FORMAT = 2
+SELECT_BATCH = 500     # isbns per "WHERE isbn IN (...)" when catching up
+
+_STOP_WORDS = {
+    "a", "an", "and", "the", "of", "on", "in", "for", "to", "with", "about",
+    "some", "something", "book", "books", "by", "me", "i", "want", "any",
+}
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(text: str) -> List[Tuple[int, float]]:
+    feats = []
+    for word in _WORD_RE.findall(text.lower()):
+        if word in _STOP_WORDS:
+            continue
+        feats.append((zlib.crc32(word.encode()), WORD_WEIGHT))
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            feats.append((zlib.crc32(padded[i:i + 3].encode()), NGRAM_WEIGHT))
+    return feats
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """
+    Embed texts into a contiguous float32 matrix of shape (len(texts), DIM).
+    """
+    out = np.zeros((len(texts), DIM), dtype=np.float32)
+    for start in range(0, len(texts), EMBED_BATCH):
+        batch = texts[start:start + EMBED_BATCH]
+        rows, hashes, weights = [], [], []
+        for r, text in enumerate(batch):
+            for h, w in _features(text):
+                rows.append(r)
+                hashes.append(h)
+                weights.append(w)
+        if not rows:
+            continue
+        hashes = np.asarray(hashes, dtype=np.uint32)
+        cols = (hashes % DIM).astype(np.int64)
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+        flat = np.asarray(rows, dtype=np.int64) * DIM + cols
+        block = np.bincount(flat, weights=signs * np.asarray(weights),
+                            minlength=len(batch) * DIM).reshape(len(batch), DIM)
+        out[start:start + len(batch)] = block
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    np.divide(out, norms, out=out, where=norms > 0)
+    return out
+
+
+def book_text(title: str, author: str, description: Optional[str] = None) -> str:
+    return " ".join(part for part in (title, author, description) if part)
+
+
+# ========== Index on disk ==========
+# <db>.vec.npy       float32 (capacity, DIM), opened memory-mapped
+# <db>.vec.rows      append-only log, one "row<TAB>isbn<TAB>fingerprint" line
+#                    per write; the last line for a row wins, empty isbn = deleted
+# <db>.vec.meta.json {"dim", "format", "last_seq"}: last_seq is how far the
+#                    index has read books_changes (null = never built)
+# Row i belongs to isbns[i]; a deleted book leaves a zero row and a null isbn.
+class SemanticIndex:
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.matrix_path = db_path + ".vec.npy"
+        self.rows_path = db_path + ".vec.rows"
+        self.meta_path = db_path + ".vec.meta.json"
+        self.isbns: List[Optional[str]] = []
+        self.fingerprints: List[Optional[int]] = []
+        self.matrix: Optional[np.ndarray] = None
+        self.last_seq: Optional[int] = None
+        self._row_of: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # change detection (see refresh_index)
+        self._watch_lock = threading.Lock()
+        self._watch_conn = None
+        self._data_version: Optional[int] = None
+        self._load()
+
+    def _load(self) -> None:
+        paths = (self.meta_path, self.matrix_path, self.rows_path)
+        if not all(os.path.exists(p) for p in paths):
+            return
+        with open(self.meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("dim") != DIM or meta.get("format") != INDEX_FORMAT:
+            return  # vectoriser or layout changed; rebuild from scratch
+
+        lines = 0
+        with open(self.rows_path, encoding="utf-8") as f:
+            for line in f:
+                row, isbn, fp = line.rstrip("\n").split("\t")
+                row = int(row)
+                if row >= len(self.isbns):
+                    grow = row + 1 - len(self.isbns)
+                    self.isbns.extend([None] * grow)
+                    self.fingerprints.extend([None] * grow)
+                self.isbns[row] = isbn or None
+                self.fingerprints[row] = int(fp) if fp else None
+                lines += 1
+
+        matrix = np.load(self.matrix_path, mmap_mode="r+")
+        if matrix.shape[0] < len(self.isbns):
+            self.isbns, self.fingerprints = [], []
+            return  # interrupted write; rebuild
+        self.matrix = matrix
+        self._row_of = {isbn: i for i, isbn in enumerate(self.isbns) if isbn is not None}
+        self.last_seq = meta.get("last_seq")
+        if lines > 2 * len(self.isbns) + 1000:
+            self._compact_rows()
+
+    def _row_lines(self, rows: List[int]):
+        for r in rows:
+            fp = self.fingerprints[r]
+            yield f"{r}\t{self.isbns[r] or ''}\t{'' if fp is None else fp}\n"
+
+    def _append_rows(self, rows: List[int]) -> None:
+        with open(self.rows_path, "a", encoding="utf-8") as f:
+            f.writelines(self._row_lines(rows))
+
+    def _compact_rows(self) -> None:
+        tmp = self.rows_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(self._row_lines(list(range(len(self.isbns)))))
+        os.replace(tmp, self.rows_path)
+
+    def set_last_seq(self, seq: Optional[int]) -> None:
+        self.last_seq = seq
+        tmp = self.meta_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"dim": DIM, "format": INDEX_FORMAT, "last_seq": seq}, f)
+        os.replace(tmp, self.meta_path)
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = 0 if self.matrix is None else self.matrix.shape[0]
+        if rows <= capacity:
+            return
+        # headroom so the books added after a build do not copy the matrix
+        new_capacity = max(rows + rows // 4, int(capacity * 1.5), 1024)
+        tmp = self.matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32,
+                                          shape=(new_capacity, DIM))
+        if capacity:
+            grown[:capacity] = self.matrix
+        grown.flush()
+        # the mapping follows the file across the rename; searches keep the
+        # old matrix until this single assignment swaps in the new one
+        os.replace(tmp, self.matrix_path)
+        self.matrix = grown
+
+    def upsert(self, books: List[Tuple[str, str, int]]) -> int:
+        """
+        books = [(isbn, text, fingerprint), ...]
+        Re-embeds only books whose fingerprint changed. Returns rows written.
+        """
+        with self._lock:
+            changed = [b for b in books
+                       if self._row_of.get(b[0]) is None
+                       or self.fingerprints[self._row_of[b[0]]] != b[2]]
+            if not changed:
+                return 0
+
+            new = [b for b in changed if b[0] not in self._row_of]
+            self._ensure_capacity(len(self.isbns) + len(new))
+            rows = np.fromiter((self._row_of.get(b[0], -1) for b in changed), dtype=np.int64,
+                               count=len(changed))
+            self.matrix[rows[rows >= 0]] = embed_texts([b[1] for b, r in zip(changed, rows) if r >= 0])
+            # rows for new books are written before their isbns appear, so a
+            # concurrent search never sees an isbn whose vector is missing
+            if new:
+                start = len(self.isbns)
+                self.matrix[start:start + len(new)] = embed_texts([b[1] for b in new])
+            for isbn, _, _ in new:
+                self._row_of[isbn] = len(self.isbns)
+                self.isbns.append(isbn)
+                self.fingerprints.append(None)
+
+            for isbn, _, fp in changed:
+                self.fingerprints[self._row_of[isbn]] = fp
+            self.matrix.flush()
+            self._append_rows([self._row_of[b[0]] for b in changed])
+            return len(changed)
+
+    def remove(self, isbns: List[str]) -> int:
+        with self._lock:
+            rows = []
+            for isbn in isbns:
+                row = self._row_of.pop(isbn, None)
+                if row is None:
+                    continue
+                self.matrix[row] = 0.0
+                self.isbns[row] = None
+                self.fingerprints[row] = None
+                rows.append(row)
+            if rows:
+                self.matrix.flush()
+                self._append_rows(rows)
+            return len(rows)
+
+    def search(self, queries: List[str], k: int = 10,
+               min_score: float = MIN_SCORE) -> List[List[Tuple[str, float]]]:
+        """
+        Cosine top-k for a batch of queries.
+        Returns one [(isbn, score), ...] list per query, best first.
+        """
+        q = embed_texts(queries)
+        # isbns only grows (deleted rows become None), so rows < n stay valid;
+        # take n before the matrix, which upsert grows before appending isbns
+        isbns = self.isbns
+        n = len(isbns)
+        matrix = self.matrix
+        if matrix is None or n == 0:
+            return [[] for _ in queries]
+
+        k = min(k, n)
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, n, SEARCH_CHUNK):
+            block = matrix[start:min(n, start + SEARCH_CHUNK)]
+            scores = q @ block.T  # (queries, rows)
+            kk = min(k, scores.shape[1])
+            top = np.argpartition(-scores, kk - 1, axis=1)[:, :kk]
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, top + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+        results = []
+        for scores, rows in zip(best_scores, best_rows):
+            order = np.argsort(-scores)
+            results.append([
+                (isbns[rows[i]], float(scores[i]))
+                for i in order
+                if scores[i] >= min_score and isbns[rows[i]] is not None
+            ])
+        return results
+
+
+_indexes: Dict[str, SemanticIndex] = {}
+_indexes_lock = threading.Lock()
+_builds: Dict[str, threading.Thread] = {}
+_build_errors: Dict[str, BaseException] = {}
+
+
+def get_index(branch: Optional[str] = None) -> SemanticIndex:
+    path = shard_path(branch)
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = SemanticIndex(path)
+        return _indexes[path]
+
+
+def _description_column(conn) -> str:
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(books)")}
+    return "description" if "description" in columns else "NULL"
+
+
+def _select_books(conn, isbns: Optional[List[str]] = None):
+    desc = _description_column(conn)
+    sql = f"SELECT isbn, title, author, {desc} AS description FROM books"
+    if isbns is None:
+        return conn.execute(sql).fetchall()
+    rows = []
+    for start in range(0, len(isbns), SELECT_BATCH):
+        batch = isbns[start:start + SELECT_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        rows.extend(conn.execute(f"{sql} WHERE isbn IN ({placeholders})", batch).fetchall())
+    return rows
+
+
+def _as_entries(rows) -> List[Tuple[str, str, int]]:
+    entries = []
+    for r in rows:
+        text = book_text(r["title"], r["author"], r["description"])
+        entries.append((r["isbn"], text, zlib.crc32(text.encode())))
+    return entries
+
+
+def _max_seq(conn) -> int:
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM books_changes").fetchone()[0]
+
+
+def sync_index(branch: Optional[str] = None) -> Dict[str, int]:
+    """
+    Full pass: bring the index in line with the whole books table.
+    Used to build the index; afterwards refresh_index only reads the rows
+    listed in books_changes. Returns {embedded, removed, total}
+    """
+    index = get_index(branch)
+    conn = get_read_connection(branch)
+    try:
+        # one snapshot, so the books read and the change-log position agree
+        conn.execute("BEGIN")
+        last_seq = _max_seq(conn)
+        entries = _as_entries(_select_books(conn))
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    embedded = index.upsert(entries)
+    current = {isbn for isbn, _, _ in entries}
+    removed = index.remove([isbn for isbn in list(index._row_of) if isbn not in current])
+    index.set_last_seq(last_seq)
+    return {"embedded": embedded, "removed": removed, "total": len(current)}
+
+
+def update_books(isbns: List[str], branch: Optional[str] = None) -> int:
+    """
+    Re-index specific books after they were added or edited.
+    Books that no longer exist are removed from the index.
+    """
+    isbns = list(dict.fromkeys(isbns))
+    if not isbns:
+        return 0
+    index = get_index(branch)
+    conn = get_read_connection(branch)
+    try:
+        entries = _as_entries(_select_books(conn, isbns))
+    finally:
+        conn.close()
+    found = {isbn for isbn, _, _ in entries}
+    return index.upsert(entries) + index.remove([i for i in isbns if i not in found])
+
+
+def refresh_index(branch: Optional[str] = None) -> Optional[Dict[str, int]]:
+    """
+    Catch up with books_changes since the index's last_seq.
+    PRAGMA data_version (O(1)) tells whether anything was committed at all;
+    then only the changed isbns are read and re-embedded, so the cost is
+    proportional to the changes, not to the table.
+    Returns {changed, written}, or None if nothing changed.
+    """
+    index = get_index(branch)
+    if index.last_seq is None:
+        raise ValueError("Semantic index is not built yet")
+
+    with index._watch_lock:
+        if index._watch_conn is None:
+            index._watch_conn = get_read_connection(branch, check_same_thread=False)
+        conn = index._watch_conn
+
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == index._data_version:
+            return None
+        index._data_version = version
+
+        rows = conn.execute(
+            "SELECT seq, isbn FROM books_changes WHERE seq > ? ORDER BY seq",
+            (index.last_seq,),
+        ).fetchall()
+        if not rows:
+            return None
+
+        isbns = list(dict.fromkeys(r["isbn"] for r in rows))
+        written = update_books(isbns, branch)
+        index.set_last_seq(rows[-1]["seq"])
+        return {"changed": len(isbns), "written": written}
+
+
+def _build(branch: Optional[str], path: str) -> None:
+    try:
+        sync_index(branch)
+    except BaseException as e:
+        _build_errors[path] = e
+        print(f"Semantic index build failed for {path}:", e)
+
+
+def start_build(branch: Optional[str] = None) -> Optional[threading.Thread]:
+    """
+    Build the index in a background thread if it does not exist yet.
+    Returns the build thread (None if already built).
+    """
+    index = get_index(branch)
+    if index.last_seq is not None:
+        return None
+    with _indexes_lock:
+        thread = _builds.get(index.db_path)
+        if thread is None or (not thread.is_alive() and index.last_seq is None):
+            _build_errors.pop(index.db_path, None)
+            thread = threading.Thread(target=_build, args=(branch, index.db_path),
+                                      name=f"semantic-build-{branch}", daemon=True)
+            _builds[index.db_path] = thread
+            thread.start()
+        return thread
+
+
+def warm_indexes() -> None:
+    """
+    Start background builds for every branch whose index is missing
+    (called at app start, so the first semantic search finds them ready).
+    """
+    for branch in list_branches():
+        try:
+            start_build(branch)
+        except Exception as e:
+            print(f"Semantic index warm-up failed for branch {branch}:", e)
+
+
+def ensure_index(branch: Optional[str] = None, wait_for_build: bool = True) -> None:
+    """
+    Make the index current: catch up on changes, or build it first.
+    With wait_for_build=False a missing index raises ValueError while it
+    builds in the background.
+    """
+    index = get_index(branch)
+    if index.last_seq is None:
+        thread = start_build(branch)
+        if not wait_for_build:
+            raise ValueError(
+                f"Semantic index for branch '{branch}' is still being built; "
+                "search by title or author meanwhile"
+            )
+        thread.join()
+        if index.last_seq is None:
+            raise _build_errors.get(index.db_path) or ValueError("Semantic index build failed")
+    refresh_index(branch)
+
+
+def semantic_search(q: str, branch: Optional[str] = None, k: int = 10,
+                    wait_for_build: bool = True) -> List[Dict]:
+    """
+    Returns list of {isbn, title, author, price, stock, score}, best first.
+    Picks up changed books first (see ensure_index).
+    """
+    ensure_index(branch, wait_for_build=wait_for_build)
+    index = get_index(branch)
+
+    hits = index.search([q], k=k)[0]
+    if not hits:
+        return []
+
+    isbns = [isbn for isbn, _ in hits]
+    conn = get_read_connection(branch)
+    try:
+        placeholders = ",".join("?" * len(isbns))
+        rows = conn.execute(
+            f"SELECT isbn, title, author, price, stock FROM books WHERE isbn IN ({placeholders})",
+            isbns,
+        ).fetchall()
+    finally:
+        conn.close()
+
+    by_isbn = {r["isbn"]: dict(r) for r in rows}
+    return [
+        {**by_isbn[isbn], "score": round(score, 4)}
+        for isbn, score in hits
+        if isbn in by_isbn
+    ]
+
+
+# ========== CLI ==========
+# python semantic_index.py build [branch]
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "build":
+        print("usage: python semantic_index.py build [branch]")
+        sys.exit(1)
+    branch = sys.argv[2] if len(sys.argv) == 3 else None
+    info = sync_index(branch)
+    print(f"Indexed {shard_path(branch)}: {info['embedded']} embedded, "
+          f"{info['removed']} removed, {info['total']} books")